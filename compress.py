@@ -1,26 +1,54 @@
+import asyncio
+import io
 import os
 import subprocess
 import sys
+import tempfile
 import json
 import time
+from functools import lru_cache
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # --- CONFIGURATION ---
 MEDIA_DIR = 'media'
 OUTPUT_DIR = 'media_compressed'
 VIDEO_EXTS = {'.mp4', '.mov', '.webm', '.ogg', '.avi', '.mkv', '.flv'}
 
-# Number of parallel encodes (NVENC supports 3-5 simultaneous sessions)
-MAX_PARALLEL = 3
+# Input codecs NVDEC can decode on every NVENC-capable card (AV1/VC1/etc. decode on CPU)
+NVDEC_CODECS = {'h264', 'hevc', 'vp9', 'vp8', 'mpeg2video', 'mpeg4', 'mjpeg'}
+
+# NVENC chips per GPU model, matched against the name nvidia-smi reports
+NVENC_ENGINES_BY_MODEL = {
+    'RTX 5090': 3,
+    'RTX 5080': 2,
+    'RTX 5070 Ti': 2,
+    'RTX 4090': 2,
+    'RTX 4080': 2,
+    'RTX 4070 Ti': 2,
+    'RTX 6000 Ada': 3,
+}
+
+# Cached NVENC probe result, so re-runs skip the test encode
+NVENC_CACHE_FILE = os.path.join(Path.home(), '.cache', 'session26', 'nvenc.json')
+NVENC_CACHE_TTL = 24 * 60 * 60  # seconds
+
+# Number of parallel encodes: two sessions per NVENC chip keeps every engine fed;
+# unknown or single-NVENC cards stay at 3 (NVENC supports 3-5 simultaneous sessions)
+MAX_PARALLEL = 6
+FALLBACK_PARALLEL = 3
 
 # FFmpeg GPU encoding settings (NVIDIA NVENC - RTX 5070 Ti)
 GPU_SETTINGS = {
     'resolution': '1920',        # Max width (auto height, no upscale)
     'fps': 60,                   # Target framerate
     'codec': 'h264_nvenc',       # NVIDIA GPU encoder
-    'preset': 'p5',              # NVENC preset: p1(fastest)..p7(best quality), p5=good balance
+    'preset': 'p4',              # NVENC preset: p1(fastest)..p7(best quality); p4 + AQ/lookahead ~ p5 quality
     'tune': 'hq',                # Tuning: hq = high quality
+    'multipass': 'qres',         # Quarter-resolution first pass
+    'rc_lookahead': 32,          # Frames of rate-control lookahead
+    'aq': True,                  # Spatial + temporal adaptive quantization
+    'b_ref_mode': 'middle',      # Use the middle B-frame as a reference
     'rc': 'vbr',                 # Rate control: variable bitrate
     'cq': 22,                    # Constant quality level (like CRF, lower=better, 18-24 good range)
     'b_v': '8M',                 # Target video bitrate
@@ -31,6 +59,10 @@ GPU_SETTINGS = {
     'pixel_format': 'yuv420p',   # Pixel format
 }
 
+# H.264 inputs already within 1920x1080 and at or under this bitrate are remuxed
+# (stream copy + faststart) instead of re-encoded
+REMUX_MAX_BITRATE = 9_000_000  # bits/s
+
 # Fallback CPU settings (if GPU fails)
 CPU_SETTINGS = {
     'resolution': '1920',
@@ -38,6 +70,8 @@ CPU_SETTINGS = {
     'codec': 'libx264',
     'crf': 20,
     'preset': 'medium',          # Faster than 'slow' for CPU fallback
+    'threads': max(2, os.cpu_count() or 4),  # x264 threads; main() splits cores across concurrent encodes
+    'x264_params': 'lookahead_threads=2:sliced_threads=0',
     'audio_bitrate': '192k',
     'audio_codec': 'aac',
     'pixel_format': 'yuv420p',
@@ -57,9 +91,52 @@ def check_ffmpeg():
         return False
 
 
+def detect_nvenc_engines():
+    """NVENC chip count of the first GPU from its model name, or None if unknown."""
+    try:
+        result = subprocess.run(['nvidia-smi', '--query-gpu=name', '--format=csv,noheader'],
+                                capture_output=True, text=True, timeout=5)
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return None
+    names = result.stdout.strip().splitlines()
+    if result.returncode != 0 or not names:
+        return None
+    for model, engines in NVENC_ENGINES_BY_MODEL.items():
+        if model in names[0]:
+            return engines
+    return None
+
+
+def gpu_parallel_encodes():
+    """Parallel NVENC encodes for this machine's GPU."""
+    engines = detect_nvenc_engines()
+    if engines is None:
+        return FALLBACK_PARALLEL
+    return min(MAX_PARALLEL, 2 * engines)
+
+
 def check_nvenc():
-    """Test if NVENC actually works by doing a tiny encode."""
-    import tempfile
+    """Test if NVENC works: encoder listing, then a cached result or a tiny test encode."""
+
+    # Cheap check first: no h264_nvenc in this build means no need to try an encode
+    try:
+        result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'],
+                                capture_output=True, text=True, timeout=5)
+        if 'h264_nvenc' not in result.stdout:
+            print("  ⚠️  NVENC unavailable, falling back to CPU encoding")
+            return False
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        pass
+
+    try:
+        with open(NVENC_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('nvenc') and time.time() - cached.get('checked_at', 0) < NVENC_CACHE_TTL:
+            print("  ✅ NVENC: NVIDIA GPU encoding ready (cached)")
+            return True
+    except (OSError, ValueError):
+        pass
+
     test_output = os.path.join(tempfile.gettempdir(), '_nvenc_test.mp4')
     try:
         cmd = [
@@ -72,10 +149,12 @@ def check_nvenc():
         # Check if output file was created (most reliable check)
         if os.path.exists(test_output) and os.path.getsize(test_output) > 0:
             os.remove(test_output)
+            save_nvenc_cache()
             print("  ✅ NVENC: NVIDIA GPU encoding ready (RTX 5070 Ti)")
             return True
         # Fallback: check if encoder was initialized in stderr
         if 'h264_nvenc' in result.stderr and result.returncode == 0:
+            save_nvenc_cache()
             print("  ✅ NVENC: NVIDIA GPU encoding ready")
             return True
     except Exception:
@@ -88,28 +167,61 @@ def check_nvenc():
     return False
 
 
-def get_video_info(filepath):
-    """Get video metadata using ffprobe."""
+def save_nvenc_cache():
+    """Remember a successful NVENC test encode for NVENC_CACHE_TTL seconds."""
     try:
-        cmd = [
-            'ffprobe', '-v', 'quiet',
-            '-print_format', 'json',
-            '-show_format', '-show_streams',
-            filepath
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        data = json.loads(result.stdout)
+        os.makedirs(os.path.dirname(NVENC_CACHE_FILE), exist_ok=True)
+        with open(NVENC_CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump({'nvenc': True, 'checked_at': time.time()}, f)
+    except OSError:
+        pass
+
+
+@lru_cache(maxsize=None)
+def has_zscale():
+    """Check once whether this FFmpeg build includes the zimg-based zscale filter."""
+    try:
+        result = subprocess.run(['ffmpeg', '-hide_banner', '-filters'],
+                                capture_output=True, text=True, timeout=5)
+        return ' zscale ' in result.stdout
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return False
+
+
+EMPTY_VIDEO_INFO = {'duration': 0, 'size': 0, 'width': 0, 'height': 0, 'fps': 0, 'codec': '',
+                    'pix_fmt': '', 'audio_codec': ''}
+
+
+def build_probe_cmd(filepath):
+    """Build the ffprobe command used for video metadata."""
+    return [
+        'ffprobe', '-v', 'quiet',
+        '-print_format', 'json',
+        '-show_entries', 'stream=codec_type,codec_name,width,height,r_frame_rate,pix_fmt:format=duration,size',
+        filepath
+    ]
+
+
+def parse_video_info(probe_output):
+    """Turn ffprobe JSON output (bytes) into the metadata dict used by the encoder."""
+    try:
+        data = json.loads(probe_output)
 
         video_stream = None
+        audio_stream = None
         for stream in data.get('streams', []):
-            if stream.get('codec_type') == 'video':
+            if stream.get('codec_type') == 'video' and video_stream is None:
                 video_stream = stream
-                break
+            elif stream.get('codec_type') == 'audio' and audio_stream is None:
+                audio_stream = stream
 
         duration = float(data.get('format', {}).get('duration', 0))
         size = int(data.get('format', {}).get('size', 0))
         width = int(video_stream.get('width', 0)) if video_stream else 0
         height = int(video_stream.get('height', 0)) if video_stream else 0
+        codec = video_stream.get('codec_name', '') if video_stream else ''
+        pix_fmt = video_stream.get('pix_fmt', '') if video_stream else ''
+        audio_codec = audio_stream.get('codec_name', '') if audio_stream else ''
 
         fps_str = video_stream.get('r_frame_rate', '0/1') if video_stream else '0/1'
         try:
@@ -118,9 +230,48 @@ def get_video_info(filepath):
         except:
             fps = 0
 
-        return {'duration': duration, 'size': size, 'width': width, 'height': height, 'fps': fps}
+        return {'duration': duration, 'size': size, 'width': width, 'height': height,
+                'fps': fps, 'codec': codec, 'pix_fmt': pix_fmt, 'audio_codec': audio_codec}
+    except:
+        return dict(EMPTY_VIDEO_INFO)
+
+
+def get_video_info(filepath):
+    """Get video metadata using ffprobe."""
+    try:
+        result = subprocess.run(build_probe_cmd(filepath), capture_output=True,
+                                stdin=subprocess.DEVNULL, timeout=30)
+        return parse_video_info(result.stdout)
     except:
-        return {'duration': 0, 'size': 0, 'width': 0, 'height': 0, 'fps': 0}
+        return dict(EMPTY_VIDEO_INFO)
+
+
+async def get_video_info_async(filepath, limit):
+    """Async get_video_info: runs ffprobe without tying up a thread while it waits."""
+    async with limit:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *build_probe_cmd(filepath),
+                stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+        except OSError:
+            return dict(EMPTY_VIDEO_INFO)
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=30)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return dict(EMPTY_VIDEO_INFO)
+    return parse_video_info(stdout)
+
+
+def prefetch_metadata(paths):
+    """Probe all videos up front, concurrently from one event loop. Returns {path: info}."""
+    async def probe_all():
+        limit = asyncio.Semaphore(os.cpu_count() or 4)
+        return await asyncio.gather(*(get_video_info_async(p, limit) for p in paths))
+
+    return dict(zip(paths, asyncio.run(probe_all())))
 
 
 def format_size(size_bytes):
@@ -144,30 +295,58 @@ def format_duration(seconds):
     return f"{mins}m {secs}s"
 
 
-def build_gpu_cmd(input_path, output_path):
-    """Build FFmpeg command for NVENC GPU encoding."""
+def build_gpu_cmd(input_path, output_path, hw_decode=True):
+    """Build FFmpeg command for NVENC GPU encoding.
+
+    With hw_decode, frames stay in VRAM from NVDEC through scale_cuda into NVENC.
+    Otherwise the input is decoded and scaled on the CPU and only encoded on the GPU.
+    """
     s = GPU_SETTINGS
-    # Cap to FHD 1920x1080 max (no upscaling, keep aspect ratio, divisible by 2)
-    scale_filter = (
-        "scale='min(iw,1920)':'min(ih,1080)':force_original_aspect_ratio=decrease,"
-        "pad='ceil(iw/2)*2':'ceil(ih/2)*2'"
-    )
+    if hw_decode:
+        # Cap to FHD 1920x1080 max on the GPU (no upscaling, keep aspect ratio, divisible by 2).
+        # scale_cuda also does the yuv420p conversion, so no -pix_fmt here.
+        decode_args = [
+            '-hwaccel', 'cuda',                 # GPU-accelerated decoding
+            '-hwaccel_output_format', 'cuda',   # Keep decoded frames in VRAM
+            '-extra_hw_frames', '4',            # Avoid "No decoder surfaces left"
+        ]
+        filter_args = [
+            '-vf',
+            "scale_cuda=w='min(iw,1920)':h='min(ih,1080)':force_original_aspect_ratio=decrease:"
+            f"force_divisible_by=2:format={s['pixel_format']}",
+        ]
+    else:
+        decode_args = []
+        filter_args = [
+            '-vf',
+            "scale='min(iw,1920)':'min(ih,1080)':force_original_aspect_ratio=decrease,"
+            "pad='ceil(iw/2)*2':'ceil(ih/2)*2'",
+            '-pix_fmt', s['pixel_format'],
+        ]
 
     return [
         'ffmpeg', '-y',
-        '-hwaccel', 'cuda',                 # GPU-accelerated decoding
+        '-nostats', '-loglevel', 'error',    # Only errors on stderr
+        '-progress', 'pipe:1',               # Compact key=value progress on stdout
+        *decode_args,
         '-i', input_path,
+        '-map', '0:v:0', '-map', '0:a:0?',   # Primary video + audio (if any) only
+        '-sn', '-dn',                        # No subtitle/data streams
         '-c:v', s['codec'],                  # h264_nvenc
-        '-preset', s['preset'],              # p5 (quality/speed balance)
+        '-preset', s['preset'],              # p4 (quality/speed balance)
         '-tune', s['tune'],                  # hq
         '-rc', s['rc'],                      # vbr
+        '-multipass', s['multipass'],        # qres
+        '-rc-lookahead', str(s['rc_lookahead']),
+        '-spatial_aq', str(int(s['aq'])),
+        '-temporal_aq', str(int(s['aq'])),
+        '-b_ref_mode', s['b_ref_mode'],
         '-cq', str(s['cq']),                 # Constant quality
         '-b:v', s['b_v'],                    # Target bitrate
         '-maxrate', s['maxrate'],            # Max bitrate
         '-bufsize', s['bufsize'],            # Buffer
         '-r', str(s['fps']),                 # Framerate
-        '-vf', scale_filter,                 # Scale filter
-        '-pix_fmt', s['pixel_format'],
+        *filter_args,                        # Scale filter
         '-c:a', s['audio_codec'],
         '-b:a', s['audio_bitrate'],
         '-movflags', '+faststart',           # Web streaming optimization
@@ -179,14 +358,27 @@ def build_cpu_cmd(input_path, output_path):
     """Build FFmpeg command for CPU fallback encoding."""
     s = CPU_SETTINGS
     # Cap to FHD 1920x1080 max (no upscaling, keep aspect ratio, divisible by 2)
-    scale_filter = (
-        "scale='min(iw,1920)':'min(ih,1080)':force_original_aspect_ratio=decrease,"
-        "pad='ceil(iw/2)*2':'ceil(ih/2)*2'"
-    )
+    if has_zscale():
+        # zimg has AVX2/AVX-512 resize kernels; fit-in-box factor computed inline
+        # since zscale has no force_original_aspect_ratio
+        fit = "min(1,min(1920/iw,1080/ih))"
+        scale_filter = (
+            f"zscale=w='2*trunc(iw*{fit}/2)':h='2*trunc(ih*{fit}/2)':f=spline36,"
+            f"format={s['pixel_format']}"
+        )
+    else:
+        scale_filter = (
+            "scale='min(iw,1920)':'min(ih,1080)':force_original_aspect_ratio=decrease,"
+            "pad='ceil(iw/2)*2':'ceil(ih/2)*2'"
+        )
 
     return [
         'ffmpeg', '-y',
+        '-nostats', '-loglevel', 'error',
+        '-progress', 'pipe:1',
         '-i', input_path,
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-sn', '-dn',
         '-c:v', s['codec'],
         '-preset', s['preset'],
         '-crf', str(s['crf']),
@@ -196,56 +388,118 @@ def build_cpu_cmd(input_path, output_path):
         '-c:a', s['audio_codec'],
         '-b:a', s['audio_bitrate'],
         '-movflags', '+faststart',
-        '-threads', '0',
+        '-threads', str(s['threads']),
+        '-x264-params', s['x264_params'],
         output_path
     ]
 
 
-def compress_video(input_path, output_path, index, total, use_gpu=True):
+def is_within_target(info):
+    """True if the file already meets every encode target, so a stream copy is enough.
+
+    That is H.264 in the encoder's pixel format, FHD or smaller, within the fps cap,
+    low bitrate, and AAC audio (or none): anything else must go through the encoder.
+    """
+    s = GPU_SETTINGS
+    if info['codec'] != 'h264' or info['pix_fmt'] != s['pixel_format']:
+        return False
+    if not info['width'] or not info['height'] or not 0 < info['fps'] <= s['fps']:
+        return False
+    if info['audio_codec'] not in ('', s['audio_codec']):
+        return False
+    bitrate = info['size'] * 8 / max(info['duration'], 1)
+    return info['width'] <= 1920 and info['height'] <= 1080 and bitrate <= REMUX_MAX_BITRATE
+
+
+def build_remux_cmd(input_path, output_path):
+    """Build FFmpeg command that copies streams into a web-ready MP4 without re-encoding."""
+    return [
+        'ffmpeg', '-y',
+        '-nostats', '-loglevel', 'error',
+        '-progress', 'pipe:1',
+        '-i', input_path,
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-sn', '-dn',
+        '-c', 'copy',
+        '-movflags', '+faststart',
+        output_path
+    ]
+
+
+def run_ffmpeg(cmd):
+    """Run an FFmpeg command. Returns (returncode, stderr text, seconds encoded).
+
+    Commands are built with -progress pipe:1 and -loglevel error, so stdout is a small
+    key=value stream consumed line by line, keeping only the last output timestamp.
+    stderr goes to a temp file rather than a pipe: corrupt input can log an error per
+    frame, and a full stderr pipe nobody reads would block ffmpeg forever.
+    """
+    out_time = 0.0
+    with tempfile.TemporaryFile() as err_file:
+        process = subprocess.Popen(
+            cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=err_file
+        )
+        for line in process.stdout:
+            # out_time_ms is in microseconds too (long-standing ffmpeg quirk)
+            key, _, value = line.partition(b'=')
+            if key in (b'out_time_us', b'out_time_ms') and value.strip().isdigit():
+                out_time = int(value) / 1_000_000
+        process.wait()
+        if process.returncode == 0:
+            return process.returncode, '', out_time
+        err_file.seek(0)
+        return process.returncode, err_file.read().decode('utf-8', 'replace'), out_time
+
+
+def compress_video(input_path, output_path, index, total, use_gpu=True, info=None,
+                   original_size=None):
     """Compress a single video. Returns (success, filename, original_size, compressed_size, elapsed)."""
     filename = os.path.basename(input_path)
-    original_size = os.path.getsize(input_path)
-    info = get_video_info(input_path)
+    if original_size is None:
+        original_size = os.path.getsize(input_path)
+    if info is None:
+        info = get_video_info(input_path)
 
     label = f"[{index}/{total}]"
     mode = "🟢 GPU" if use_gpu else "🔵 CPU"
+    # Only ask NVDEC for codecs it can actually decode; others decode on CPU
+    can_nvdec = info.get('codec') in NVDEC_CODECS
     print(f"  {label} {mode} ⏳ {filename} "
           f"({info['width']}x{info['height']} @ {info['fps']}fps, {format_size(original_size)})")
 
     # Build command
     if use_gpu:
-        cmd = build_gpu_cmd(input_path, output_path)
+        cmd = build_gpu_cmd(input_path, output_path, hw_decode=can_nvdec)
     else:
         cmd = build_cpu_cmd(input_path, output_path)
 
     start_time = time.time()
 
     try:
-        process = subprocess.Popen(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-            universal_newlines=True
-        )
-        _, stderr = process.communicate()
+        returncode = None
+        # Nothing to gain from re-encoding: remux at disk speed, encode only if the copy fails
+        if is_within_target(info):
+            returncode, stderr, out_time = run_ffmpeg(build_remux_cmd(input_path, output_path))
+            if returncode == 0:
+                mode = "⚪ COPY"
+        if returncode != 0:
+            returncode, stderr, out_time = run_ffmpeg(cmd)
         elapsed = time.time() - start_time
 
         # If GPU fails, retry with CPU
-        if process.returncode != 0 and use_gpu:
+        if returncode != 0 and use_gpu:
             print(f"  {label} ⚠️  GPU failed for {filename}, retrying with CPU...")
             cmd = build_cpu_cmd(input_path, output_path)
             start_time = time.time()
-            process = subprocess.Popen(
-                cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
-            _, stderr = process.communicate()
+            returncode, stderr, out_time = run_ffmpeg(cmd)
             elapsed = time.time() - start_time
             mode = "🔵 CPU"
 
-        if process.returncode != 0:
+        if returncode != 0:
             error_lines = stderr.strip().split('\n')[-2:]
-            print(f"  {label} ❌ FAILED: {filename}")
-            for line in error_lines:
-                print(f"       {line.strip()}")
+            # One print so lines from parallel workers don't interleave
+            print(f"  {label} ❌ FAILED: {filename} (stopped at {format_duration(out_time)})\n"
+                  + "\n".join(f"       {line.strip()}" for line in error_lines))
             return (False, filename, original_size, 0, elapsed)
 
         compressed_size = os.path.getsize(output_path)
@@ -253,11 +507,11 @@ def compress_video(input_path, output_path, index, total, use_gpu=True):
         savings_pct = (savings / original_size * 100) if original_size > 0 else 0
 
         if savings > 0:
-            print(f"  {label} ✅ {filename}: {format_size(original_size)} → "
+            print(f"  {label} {mode} ✅ {filename}: {format_size(original_size)} → "
                   f"{format_size(compressed_size)} (-{savings_pct:.1f}%) "
                   f"[{elapsed:.1f}s]")
         else:
-            print(f"  {label} ⚠️  {filename}: already optimal "
+            print(f"  {label} {mode} ⚠️  {filename}: already optimal "
                   f"({format_size(original_size)} → {format_size(compressed_size)}) "
                   f"[{elapsed:.1f}s]")
 
@@ -288,21 +542,22 @@ def main():
 
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-    # Find all videos
-    videos = []
-    for f in sorted(os.listdir(MEDIA_DIR)):
-        if f.startswith('.'):
-            continue
-        _, ext = os.path.splitext(f)
-        if ext.lower() in VIDEO_EXTS:
-            videos.append(f)
+    # Find all videos, keeping the size from the directory walk: (name, size)
+    with os.scandir(MEDIA_DIR) as it:
+        videos = sorted(
+            (e.name, e.stat().st_size) for e in it
+            if not e.name.startswith('.') and os.path.splitext(e.name)[1].lower() in VIDEO_EXTS
+        )
 
     if not videos:
         print(f"\n📭 No videos found in '{MEDIA_DIR}/'")
         sys.exit(0)
 
-    total_original = sum(os.path.getsize(os.path.join(MEDIA_DIR, v)) for v in videos)
-    parallel = MAX_PARALLEL if use_gpu else 1  # CPU: sequential, GPU: parallel
+    total_original = sum(size for _, size in videos)
+    parallel = gpu_parallel_encodes() if use_gpu else 1  # CPU: sequential, GPU: parallel
+    # Explicit count instead of -threads 0 (which oversubscribes when several x264 run),
+    # sized so up to `parallel` CPU encodes/fallbacks share the cores without idling them
+    CPU_SETTINGS['threads'] = max(2, (os.cpu_count() or 4) // parallel)
 
     print(f"\n📂 Found {len(videos)} videos ({format_size(total_original)})")
     print(f"📁 Output: {OUTPUT_DIR}/")
@@ -319,8 +574,13 @@ def main():
         print(f"\n⚙️  CPU Settings:")
         print(f"   Encoder:    {s['codec']} (preset {s['preset']})")
         print(f"   Quality:    CRF {s['crf']}")
+        print(f"   Threads:    {s['threads']}")
         print(f"   Resolution: ≤{s['resolution']}p @ {s['fps']}fps")
 
+    # Probe every file once before any encoder starts
+    print(f"\n🔍 Probing {len(videos)} videos...")
+    metadata = prefetch_metadata([os.path.join(MEDIA_DIR, name) for name, _ in videos])
+
     print(f"\n{'─'*60}")
     print(f"  Starting compression...")
     print(f"{'─'*60}")
@@ -330,24 +590,33 @@ def main():
 
     # Build task list
     tasks = []
-    for i, filename in enumerate(videos, 1):
+    for i, (filename, size) in enumerate(videos, 1):
         input_path = os.path.join(MEDIA_DIR, filename)
         output_name = Path(filename).stem + '.mp4'
         output_path = os.path.join(OUTPUT_DIR, output_name)
-        tasks.append((input_path, output_path, i, len(videos)))
+        tasks.append((input_path, output_path, i, len(videos), size))
 
-    # Parallel execution with ThreadPool
-    with ThreadPoolExecutor(max_workers=parallel) as executor:
-        futures = {
-            executor.submit(
-                compress_video, inp, out, idx, total, use_gpu
-            ): idx
-            for inp, out, idx, total in tasks
-        }
+    # Longest job first (duration x pixels) so a big file never ends up as the lone tail
+    def task_cost(task):
+        info = metadata[task[0]]
+        return info['duration'] * info['width'] * info['height']
+    tasks.sort(key=task_cost, reverse=True)
 
-        for future in as_completed(futures):
-            result = future.result()
-            results.append(result)
+    # Parallel execution with ThreadPool: keep exactly `parallel` encodes in flight,
+    # submitting the next task as soon as any slot frees up
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        in_flight = set()
+        for inp, out, idx, total, size in tasks:
+            in_flight.add(executor.submit(
+                compress_video, inp, out, idx, total, use_gpu, metadata[inp], size
+            ))
+            if len(in_flight) < parallel:
+                continue
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            results.extend(f.result() for f in done)
+
+        for future in wait(in_flight).done:
+            results.append(future.result())
 
     global_elapsed = time.time() - global_start
 
@@ -359,23 +628,27 @@ def main():
     total_saved = total_orig - total_compressed
     saved_pct = (total_saved / total_orig * 100) if total_orig > 0 else 0
 
-    print(f"\n{'='*60}")
-    print(f"  📊 COMPRESSION SUMMARY")
-    print(f"{'='*60}")
-    print(f"  Mode:       {'🟢 GPU (NVENC)' if use_gpu else '🔵 CPU (x264)'}")
-    print(f"  Parallel:   {parallel} workers")
-    print(f"  ✅ Success:  {len(success)}/{len(videos)}")
+    # Build the summary in memory and write it in one go
+    buf = io.StringIO()
+    print(f"\n{'='*60}", file=buf)
+    print(f"  📊 COMPRESSION SUMMARY", file=buf)
+    print(f"{'='*60}", file=buf)
+    print(f"  Mode:       {'🟢 GPU (NVENC)' if use_gpu else '🔵 CPU (x264)'}", file=buf)
+    print(f"  Parallel:   {parallel} workers", file=buf)
+    print(f"  ✅ Success:  {len(success)}/{len(videos)}", file=buf)
     if failed:
-        print(f"  ❌ Failed:   {len(failed)}")
+        print(f"  ❌ Failed:   {len(failed)}", file=buf)
         for r in failed:
-            print(f"     • {r[1]}")
-    print(f"  📦 Original:   {format_size(total_orig)}")
-    print(f"  📦 Compressed: {format_size(total_compressed)}")
-    print(f"  💾 Saved:      {format_size(total_saved)} (-{saved_pct:.1f}%)")
-    print(f"  ⏱️  Total time: {format_duration(global_elapsed)}")
-    print(f"  📁 Output:     {OUTPUT_DIR}/")
-    print(f"{'='*60}")
-    print(f"\n💡 Compressed files in '{OUTPUT_DIR}/'.")
+            print(f"     • {r[1]}", file=buf)
+    print(f"  📦 Original:   {format_size(total_orig)}", file=buf)
+    print(f"  📦 Compressed: {format_size(total_compressed)}", file=buf)
+    print(f"  💾 Saved:      {format_size(total_saved)} (-{saved_pct:.1f}%)", file=buf)
+    print(f"  ⏱️  Total time: {format_duration(global_elapsed)}", file=buf)
+    print(f"  📁 Output:     {OUTPUT_DIR}/", file=buf)
+    print(f"{'='*60}", file=buf)
+    print(f"\n💡 Compressed files in '{OUTPUT_DIR}/'.", file=buf)
+    sys.stdout.write(buf.getvalue())
+    sys.stdout.flush()
 
 
 if __name__ == '__main__':
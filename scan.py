@@ -1,13 +1,57 @@
 import os
+import re
 import json
-from flask import Flask, render_template_string, request, redirect, url_for, send_from_directory, jsonify
+import hashlib
+import subprocess
+import tempfile
+import threading
+from collections import Counter
+from functools import lru_cache
+from flask import Flask, render_template, request, redirect, url_for, send_from_directory, jsonify, Response
 from urllib.parse import unquote, quote
+from jinja2 import DictLoader, FileSystemBytecodeCache
+from werkzeug.security import safe_join
+
+try:
+    import orjson  # Optional: much faster parse/serialize of media.json
+except ImportError:
+    orjson = None
+
+try:
+    from flask_compress import Compress  # Optional: gzip/brotli for HTML and JSON responses
+except ImportError:
+    Compress = None
+
+try:
+    from waitress import serve  # Optional: multi-threaded production WSGI server for `python scan.py`
+except ImportError:
+    serve = None
 
 app = Flask(__name__)
 
 # --- CONFIGURATION ---
 MEDIA_DIR = 'media'
 DATA_FILE = 'media.json'
+# Tag -> entry ids, derived from DATA_FILE. One {"tag": ..., "ids": [...]} object per line;
+# saves append lines for just the new ids, so readers concatenate ids of repeated tags
+TAGS_INDEX_FILE = 'tags_index.ndjson'
+THUMB_DIR = '.thumbs'  # Generated JPEG previews for videos in the list view
+JINJA_CACHE_DIR = '.jinja_cache'  # Compiled template bytecode, reused across restarts
+
+# Behind Apache mod_xsendfile / lighttpd, set USE_X_SENDFILE=1 so media bodies are
+# sent by the front server (sendfile) instead of being streamed through Python
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
+
+# Compress text responses over 1 KB when flask-compress is installed
+app.config['COMPRESS_MIN_SIZE'] = 1024
+if Compress:
+    Compress(app)
+
+# Templates are Python strings that only change with this file: never re-check them per render
+app.config['TEMPLATES_AUTO_RELOAD'] = False
+
+# Static assets are cache-busted by content hash (?v=...), so they can be cached for a year
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 31536000
 
 DEFAULT_TITLE = "Farewell Party"
 DEFAULT_DATE = "Teachers' Day"
@@ -21,9 +65,10 @@ GITHUB_LFS_BASE = f"https://media.githubusercontent.com/media/{GITHUB_USER}/{GIT
 # Supported Extensions
 IMAGE_EXTS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
 VIDEO_EXTS = {'.mp4', '.mov', '.webm', '.ogg'}
+EXT_TO_TYPE = {e: 'image' for e in IMAGE_EXTS} | {e: 'video' for e in VIDEO_EXTS}
 
-# --- HTML TEMPLATE ---
-HTML_TEMPLATE = """
+# --- HTML TEMPLATES ---
+BASE_TEMPLATE = """
 <!DOCTYPE html>
 <html lang="en" class="dark">
 <head>
@@ -31,20 +76,7 @@ HTML_TEMPLATE = """
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Gallery Manager</title>
     <script src="https://cdn.tailwindcss.com"></script>
-    <style>
-        body { background-color: #0f172a; color: #f8fafc; font-family: sans-serif; }
-        .input-field { background: #1e293b; border: 1px solid #334155; color: white; padding: 0.75rem; border-radius: 0.5rem; width: 100%; margin-bottom: 1rem; outline: none; transition: border-color 0.2s; }
-        .input-field:focus { border-color: #3b82f6; }
-        .btn { padding: 0.5rem 1rem; border-radius: 0.5rem; font-weight: 600; cursor: pointer; transition: all 0.2s; }
-        .btn-primary { background: #3b82f6; color: white; }
-        .btn-primary:hover { background: #2563eb; }
-        .btn-success { background: #22c55e; color: white; width: 100%; padding: 0.75rem; }
-        .btn-success:hover { background: #16a34a; }
-        .card { background: #1e293b; border: 1px solid #334155; border-radius: 0.75rem; overflow: hidden; }
-        .preview-media { max-height: 400px; width: 100%; object-fit: contain; border-radius: 0.5rem; background: #000; }
-
-
-    </style>
+    <link rel="stylesheet" href="{{ url_for('static', filename='admin.css', v=admin_css_version) }}">
 </head>
 <body class="p-4 md:p-8 max-w-7xl mx-auto">
 
@@ -60,59 +92,184 @@ HTML_TEMPLATE = """
         </div>
     </header>
 
-    {% if mode == 'list' %}
+    {% block content %}{% endblock %}
+
+</body>
+</html>
+"""
+
+LIST_TEMPLATE = """{% extends "base.html" %}
+{% block content %}
         <div class="mb-12">
             <div class="flex justify-between items-end mb-6">
-                <h2 class="text-xl font-semibold text-white">Untracked Media <span class="text-gray-500 text-sm ml-2">({{ files|length }} found)</span></h2>
+                <h2 class="text-xl font-semibold text-white">Untracked Media <span class="text-gray-500 text-sm ml-2">(<span id="untracked-count">…</span> found)</span></h2>
+                <label id="bulk-select-label" class="flex items-center gap-2 text-sm text-gray-400 cursor-pointer hidden">
+                    <input type="checkbox" id="bulk-select-all" class="w-4 h-4"> Select all
+                </label>
             </div>
 
-            {% if files|length == 0 %}
-                <div class="flex flex-col items-center justify-center p-12 bg-gray-800/50 border border-gray-700 rounded-xl text-center">
-                    <div class="w-16 h-16 bg-green-500/20 rounded-full flex items-center justify-center mb-4">
-                        <svg class="w-8 h-8 text-green-500" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M5 13l4 4L19 7"></path></svg>
-                    </div>
-                    <h3 class="text-lg font-medium text-white">All Caught Up!</h3>
-                    <p class="text-gray-400 mt-2">All files in the media folder are already in your JSON database.</p>
+            <!-- Bulk add: shared details for every checked file, saved in one write -->
+            <form id="bulk-form" class="card p-4 mb-6 hidden">
+                <div class="grid grid-cols-1 md:grid-cols-3 gap-x-4">
+                    <input type="text" name="title" class="input-field" placeholder="Title (optional)">
+                    <input type="text" name="date" class="input-field" value="{{ default_date }}">
+                    <input type="text" name="extra_tags" class="input-field" placeholder="Extra tags: dance, stage, group photo">
                 </div>
-            {% else %}
-                <div class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 gap-6">
-                    {% for file in files %}
-                    <div class="card group hover:border-blue-500/50 transition-colors">
-                        <div class="h-48 bg-black relative group">
-                            {% if file.type == 'image' %}
-                                <img src="{{ url_for('serve_media', filename=file.name) }}" class="object-cover w-full h-full opacity-80 group-hover:opacity-100 transition-opacity">
-                            {% else %}
-                                <video src="{{ url_for('serve_media', filename=file.name) }}" class="object-cover w-full h-full opacity-80"></video>
-                                <div class="absolute inset-0 flex items-center justify-center pointer-events-none">
-                                    <div class="w-10 h-10 bg-white/20 rounded-full flex items-center justify-center backdrop-blur-sm">
-                                        <svg class="w-4 h-4 text-white" fill="currentColor" viewBox="0 0 24 24"><path d="M8 5v14l11-7z"/></svg>
-                                    </div>
-                                </div>
-                            {% endif %}
-                            <div class="absolute bottom-0 left-0 right-0 p-2 bg-gradient-to-t from-black/80 to-transparent">
-                                <span class="text-xs font-mono text-gray-300 truncate block">{{ file.name }}</span>
-                            </div>
-                        </div>
-                        <div class="p-4">
-                            <a href="{{ url_for('edit_media', filename=file.name) }}" class="btn btn-primary w-full block text-center text-sm">Add to Gallery</a>
+                <textarea name="description" class="input-field h-16 resize-none" placeholder="Description (optional)"></textarea>
+                <button type="submit" class="btn btn-success">Add <span id="bulk-count">0</span> selected to Gallery</button>
+            </form>
+
+            <div id="untracked-empty" class="flex flex-col items-center justify-center p-12 bg-gray-800/50 border border-gray-700 rounded-xl text-center hidden">
+                <div class="w-16 h-16 bg-green-500/20 rounded-full flex items-center justify-center mb-4">
+                    <svg class="w-8 h-8 text-green-500" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M5 13l4 4L19 7"></path></svg>
+                </div>
+                <h3 class="text-lg font-medium text-white">All Caught Up!</h3>
+                <p class="text-gray-400 mt-2">All files in the media folder are already in your JSON database.</p>
+            </div>
+            <div id="untracked-grid" class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 gap-6"></div>
+
+            <!-- Card markup, cloned once per streamed file -->
+            <template id="card-template">
+                <div class="card group hover:border-blue-500/50 transition-colors">
+                    <div class="h-48 bg-black relative group">
+                        <input type="checkbox" class="bulk-select absolute top-2 left-2 w-5 h-5 z-10 cursor-pointer">
+                        <div class="absolute bottom-0 left-0 right-0 p-2 bg-gradient-to-t from-black/80 to-transparent">
+                            <span class="card-name text-xs font-mono text-gray-300 truncate block"></span>
                         </div>
                     </div>
-                    {% endfor %}
+                    <div class="p-4">
+                        <a class="btn btn-primary w-full block text-center text-sm">Add to Gallery</a>
+                    </div>
+                </div>
+            </template>
+            <template id="image-template">
+                <img loading="lazy" class="object-cover w-full h-full opacity-80 group-hover:opacity-100 transition-opacity">
+            </template>
+            <template id="video-template">
+                <video preload="none" class="object-cover w-full h-full opacity-80"></video>
+                <div class="absolute inset-0 flex items-center justify-center pointer-events-none">
+                    <div class="w-10 h-10 bg-white/20 rounded-full flex items-center justify-center backdrop-blur-sm">
+                        <svg class="w-4 h-4 text-white" fill="currentColor" viewBox="0 0 24 24"><path d="M8 5v14l11-7z"/></svg>
+                    </div>
                 </div>
-            {% endif %}
+            </template>
         </div>
 
         <div class="border-t border-gray-700 pt-8">
-            <details class="group">
+            <details class="group" id="raw-json">
                 <summary class="flex items-center cursor-pointer list-none text-gray-500 hover:text-white mb-4">
                     <span class="text-sm font-semibold uppercase tracking-wider">View Raw JSON Data</span>
                     <svg class="w-4 h-4 ml-2 group-open:rotate-180 transition-transform" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M19 9l-7 7-7-7"></path></svg>
                 </summary>
-                <pre class="bg-gray-900 p-4 rounded-lg text-xs text-gray-400 overflow-auto max-h-96 font-mono border border-gray-800">{{ current_json }}</pre>
+                <pre class="bg-gray-900 p-4 rounded-lg text-xs text-gray-400 overflow-auto max-h-96 font-mono border border-gray-800">Loading…</pre>
             </details>
         </div>
 
-    {% elif mode == 'edit' %}
+        <script>
+            const grid = document.getElementById('untracked-grid');
+            const bulkForm = document.getElementById('bulk-form');
+            const selectAll = document.getElementById('bulk-select-all');
+            const urls = {
+                media: '{{ url_for('serve_media', filename='') }}',
+                thumb: '{{ url_for('serve_thumb', filename='') }}',
+                edit: '{{ url_for('edit_media', filename='') }}',
+            };
+
+            function buildCard(file) {
+                const name = encodeURIComponent(file.name);
+                const card = document.getElementById('card-template').content.cloneNode(true);
+                const preview = document.getElementById(file.type === 'image' ? 'image-template' : 'video-template').content.cloneNode(true);
+                if (file.type === 'image') {
+                    preview.querySelector('img').src = urls.media + name;
+                } else {
+                    preview.querySelector('video').poster = urls.thumb + name;
+                }
+                const box = card.querySelector('.bulk-select');
+                box.value = file.name;
+                box.after(preview);
+                card.querySelector('.card-name').textContent = file.name;
+                card.querySelector('a').href = urls.edit + name;
+                return card;
+            }
+
+            // Render cards as the server's NDJSON stream arrives, one DOM append per chunk
+            async function loadUntracked() {
+                const res = await fetch('{{ url_for('api_untracked') }}');
+                const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+                const files = [];
+                let buffer = '';
+                for (;;) {
+                    const {value, done} = await reader.read();
+                    if (done) break;
+                    const lines = (buffer + value).split('\\n');
+                    buffer = lines.pop();
+                    const fragment = document.createDocumentFragment();
+                    for (const line of lines) {
+                        if (!line) continue;
+                        const file = JSON.parse(line);
+                        files.push(file);
+                        fragment.appendChild(buildCard(file));
+                    }
+                    grid.appendChild(fragment);
+                    document.getElementById('untracked-count').textContent = files.length;
+                }
+
+                // Files stream in directory order; sort once at the end
+                const cards = Array.from(grid.children);
+                cards.sort((a, b) => a.querySelector('.bulk-select').value.localeCompare(b.querySelector('.bulk-select').value));
+                grid.append(...cards);
+                document.getElementById('untracked-count').textContent = files.length;
+                document.getElementById('untracked-empty').classList.toggle('hidden', files.length > 0);
+                document.getElementById('bulk-select-label').classList.toggle('hidden', files.length === 0);
+            }
+            loadUntracked();
+
+            // Bulk add: show the shared form while anything is selected, POST once
+            const boxes = () => Array.from(grid.querySelectorAll('.bulk-select'));
+            const selected = () => boxes().filter(b => b.checked).map(b => b.value);
+            const refresh = () => {
+                const count = selected().length;
+                document.getElementById('bulk-count').textContent = count;
+                bulkForm.classList.toggle('hidden', count === 0);
+                selectAll.checked = count > 0 && count === boxes().length;
+            };
+            grid.addEventListener('change', refresh);
+            selectAll.addEventListener('change', () => {
+                boxes().forEach(b => { b.checked = selectAll.checked; });
+                refresh();
+            });
+            bulkForm.addEventListener('submit', async (e) => {
+                e.preventDefault();
+                const fields = Object.fromEntries(new FormData(bulkForm));
+                const res = await fetch('{{ url_for('save_media_bulk') }}', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({...fields, files: selected()}),
+                });
+                const result = await res.json().catch(() => ({}));  // a 500 page is not JSON
+                if (!res.ok) {
+                    // Rejected payload: say why and keep the selection on the page
+                    alert(result.error || 'Bulk add failed');
+                    return;
+                }
+                window.location = result.redirect;
+            });
+
+            // Fetch the raw JSON only when the panel is first opened
+            const rawJson = document.getElementById('raw-json');
+            rawJson.addEventListener('toggle', () => {
+                if (!rawJson.open || rawJson.dataset.loaded) return;
+                rawJson.dataset.loaded = '1';
+                fetch('{{ url_for('raw_json') }}')
+                    .then(r => r.text())
+                    .then(t => { rawJson.querySelector('pre').textContent = t; });
+            });
+        </script>
+{% endblock %}
+"""
+
+EDIT_TEMPLATE = """{% extends "base.html" %}
+{% block content %}
         <div class="max-w-4xl mx-auto">
             <a href="{{ url_for('index') }}" class="inline-flex items-center text-gray-400 hover:text-white mb-6 transition-colors">
                 <svg class="w-4 h-4 mr-2" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M10 19l-7-7m0 0l7-7m-7 7h18"></path></svg>
@@ -178,135 +335,430 @@ HTML_TEMPLATE = """
                 </div>
             </div>
         </div>
-
-
-    {% endif %}
-
-</body>
-</html>
+{% endblock %}
 """
 
+# Compiled once at import; render_template() accepts the Template objects directly
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+app.jinja_env.auto_reload = False
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
+app.jinja_env.loader = DictLoader({
+    'base.html': BASE_TEMPLATE,
+    'list.html': LIST_TEMPLATE,
+    'edit.html': EDIT_TEMPLATE,
+})
+LIST_PAGE = app.jinja_env.get_template('list.html')
+EDIT_PAGE = app.jinja_env.get_template('edit.html')
+
+# Content hash of the stylesheet, used as its ?v= cache-buster
+with open(os.path.join(app.static_folder, 'admin.css'), 'rb') as f:
+    app.jinja_env.globals['admin_css_version'] = hashlib.md5(f.read()).hexdigest()[:8]
+
 # --- HELPERS ---
 
 
 
+@lru_cache(maxsize=4096)
 def make_lfs_uri(filename):
     """Construct GitHub LFS URI for a media file."""
     # Ensure filename is URL-encoded but keep parens readable
     encoded_filename = quote(filename, safe='/()')
     return f"{GITHUB_LFS_BASE}/{MEDIA_DIR}/{encoded_filename}"
 
-def load_data():
-    """Read the JSON file and return list."""
-    if not os.path.exists(DATA_FILE):
-        return []
-    try:
-        with open(DATA_FILE, 'r', encoding='utf-8-sig') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, IOError) as e:
-        print(f"Error loading {DATA_FILE}: {e}")
-        return []
+# In-memory copy of DATA_FILE; only re-read when the file changes on disk
+# keyed by (st_mtime_ns, st_size): size also catches edits within coarse mtime granularity
+# 'tags_synced': TAGS_INDEX_FILE already matches 'tags', so a save may just append to it
+_DATA_CACHE = {'stamp': None, 'data': [], 'tracked': set(), 'tags': {}, 'tags_synced': False, 'next_id': 1}
 
-def save_entry(entry):
-    """Append entry to JSON file."""
-    data = load_data()
+# Serializes cache reloads and saves across server threads: without it a reader can
+# parse the file mid-splice, or two saves can hand out the same id
+_DATA_LOCK = threading.RLock()
 
-    # Calculate unique ID
-    next_id = 1
-    if data:
-        next_id = max(item['id'] for item in data) + 1
+def data_file_stamp():
+    """Return (mtime_ns, size) of DATA_FILE from a single stat, or None if it is missing."""
+    try:
+        st = os.stat(DATA_FILE)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def src_filename(src):
+    """Media filename referenced by an entry's src URL."""
+    # Robust filename extraction: take last part of URL/path and unquote
+    # unquote handles %20 -> space, %28 -> (, etc.
+    filename_raw = src.rpartition('/')[2]
+    return unquote(filename_raw).strip()
+
+def index_tracked_files(data):
+    """Return the set of media filenames referenced by entries, warning on duplicates."""
+    srcs = [item['src'] for item in data if 'src' in item]
+    tracked_files = {src_filename(src) for src in srcs}
+
+    # Check for duplicates in media.json (strictly by src string)
+    # Fast path: one C-level set build; only walk the list when the sizes disagree
+    if len(srcs) != len(set(srcs)):
+        duplicates = [src for src, count in Counter(srcs).items() if count > 1]
+        print(f"⚠️  WARNING: Found {len(duplicates)} duplicate entries in {DATA_FILE}!")
+        for d in duplicates[:3]:
+            print(f"   - {d}")
+        if len(duplicates) > 3: print(f"   ...and {len(duplicates)-3} more")
 
-    entry['id'] = next_id
-    data.append(entry)
+    return tracked_files
+
+def build_tag_index(data):
+    """Inverted index {tag: [id, ...]} built in one pass over the entries."""
+    tag_index = {}
+    for item in data:
+        for tag in item.get('tags', ()):
+            tag_index.setdefault(tag, []).append(item['id'])
+    return tag_index
+
+def serialize_tag_index(tag_index):
+    """Tag index as lines of compact JSON, one tag per line."""
+    return ''.join(json.dumps({'tag': tag, 'ids': ids}, ensure_ascii=False, separators=(',', ':')) + '\n'
+                   for tag, ids in sorted(tag_index.items()))
+
+def write_tag_index(tag_index):
+    """Rewrite the whole tag index, compacted, via a temp file and os.replace."""
+    tmp_file = TAGS_INDEX_FILE + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        f.write(serialize_tag_index(tag_index))
+    os.replace(tmp_file, TAGS_INDEX_FILE)
+
+def append_tag_index(new_ids):
+    """Append lines for newly tagged ids only; O(new entries), not O(index)."""
+    with open(TAGS_INDEX_FILE, 'a', encoding='utf-8') as f:
+        f.write(serialize_tag_index(new_ids))
+
+def load_data(strict=False):
+    """Return the list from the JSON file, re-reading it only if it changed on disk.
+
+    A file that fails to parse reads as empty, unless strict=True (the save path):
+    then it raises, so a save never rewrites the database from an empty list.
+    """
+    with _DATA_LOCK:
+        stamp = data_file_stamp()
+        if stamp is None:
+            _DATA_CACHE.update(stamp=None, data=[], tracked=set(), tags={}, tags_synced=False, next_id=1)
+            return []
+        if stamp == _DATA_CACHE['stamp']:
+            return _DATA_CACHE['data']
+        try:
+            if orjson:
+                with open(DATA_FILE, 'rb') as f:
+                    raw = f.read()
+                data = orjson.loads(raw.removeprefix(b'\xef\xbb\xbf'))  # strip UTF-8 BOM
+            else:
+                with open(DATA_FILE, 'r', encoding='utf-8-sig') as f:
+                    data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Error loading {DATA_FILE}: {e}")
+            if strict:
+                raise
+            _DATA_CACHE.update(stamp=None, data=[], tracked=set(), tags={}, tags_synced=False, next_id=1)
+            return []
+
+        # One max() pass per (re)load; saves just increment the counter
+        next_id = max((item['id'] for item in data), default=0) + 1
+        _DATA_CACHE.update(stamp=stamp, data=data, tracked=index_tracked_files(data),
+                           tags=build_tag_index(data), tags_synced=False, next_id=next_id)
+        return data
+
+def serialize_entry(item):
+    """One entry as compact JSON (no newlines)."""
+    if orjson:
+        return orjson.dumps(item).decode('utf-8')
+    return json.dumps(item, ensure_ascii=False, separators=(',', ':'))
+
+def serialize_data(data):
+    """Compact JSON with one entry per line: no indent padding, but still diffable."""
+    if not data:
+        return '[]\n'
+    return '[\n' + ',\n'.join(serialize_entry(item) for item in data) + '\n]\n'
+
+def write_data_file(data):
+    """Rewrite the whole JSON file via a temp file and os.replace."""
+    # Write a temp file and swap it in, so a crash mid-write never leaves torn JSON
+    tmp_file = DATA_FILE + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        f.write(serialize_data(data))
+        f.flush()
+        os.fsync(f.fileno())  # data must be on disk before the rename makes it visible
+    os.replace(tmp_file, DATA_FILE)
+
+def append_to_data_file(entries):
+    """Splice new entries in before the closing ']' instead of rewriting the file.
+
+    Returns False (nothing written) if the file doesn't end in a non-empty array,
+    e.g. it is missing, empty, or was hand-edited; the caller then rewrites it.
+    """
+    try:
+        with open(DATA_FILE, 'r+b') as f:
+            size = f.seek(0, os.SEEK_END)
+            tail_start = max(0, size - 32)
+            f.seek(tail_start)
+            tail = f.read()
+
+            close = tail.rfind(b']')
+            if close < 0 or tail[close + 1:].strip():
+                return False
+            before = tail[:close].rstrip()
+            if not before.endswith(b'}'):
+                return False
+
+            f.seek(tail_start + len(before))
+            f.truncate()
+            new_lines = ',\n'.join(serialize_entry(entry) for entry in entries)
+            f.write(b',\n' + new_lines.encode('utf-8') + b'\n]\n')
+            f.flush()
+            os.fsync(f.fileno())
+        return True
+    except OSError:
+        return False
+
+def save_entries(entries):
+    """Append entries to JSON file with a single write, assigning sequential ids."""
+    with _DATA_LOCK:
+        data = load_data(strict=True)
+
+        next_id = _DATA_CACHE['next_id']
+        for entry in entries:
+            entry['id'] = next_id
+            next_id += 1
+
+        # O(1) append in the common case; full atomic rewrite if the file isn't splice-able.
+        # The cache only changes once the write succeeded, so a failed save leaves no trace
+        if not append_to_data_file(entries):
+            write_data_file(data + entries)
+
+        # Keep the cache in step with what we just wrote instead of re-parsing it
+        data.extend(entries)
+        _DATA_CACHE['tracked'].update(src_filename(e['src']) for e in entries if 'src' in e)
+        _DATA_CACHE['next_id'] = next_id
+        _DATA_CACHE['stamp'] = data_file_stamp()
+        _SCAN_CACHE['key'] = None
+
+        tag_index = _DATA_CACHE['tags']
+        new_ids = {}
+        for entry in entries:
+            for tag in entry.get('tags', ()):
+                tag_index.setdefault(tag, []).append(entry['id'])
+                new_ids.setdefault(tag, []).append(entry['id'])
+        # The first save after a (re)load compacts the index, since the database may have
+        # been edited by hand; after that only the new ids are appended. Marked unsynced
+        # while writing, so a failed write is compacted on the next save
+        synced = _DATA_CACHE['tags_synced']
+        _DATA_CACHE['tags_synced'] = False
+        if synced:
+            append_tag_index(new_ids)
+        else:
+            write_tag_index(tag_index)
+        _DATA_CACHE['tags_synced'] = True
 
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+def save_entry(entry):
+    """Append entry to JSON file."""
+    save_entries([entry])
+
+def iter_untracked_files():
+    """Yield untracked media files in directory order, as the scan finds them."""
+    load_data()
+    tracked_files = _DATA_CACHE['tracked']
+
+    with os.scandir(MEDIA_DIR) as it:
+        for entry in it:
+            f = entry.name
+            if f.startswith('.') or f in tracked_files: continue
+            if not entry.is_file(): continue
+
+            dot = f.rfind('.')
+            file_type = EXT_TO_TYPE.get(f[dot:].lower()) if dot > 0 else None
+            if file_type:
+                yield {'name': f, 'type': file_type}
+
+# Sorted result of the last scan, reused until the folder or the JSON file changes
+# keyed by (MEDIA_DIR mtime_ns, data_file_stamp()): adding/removing/renaming media bumps the dir mtime
+_SCAN_CACHE = {'key': None, 'files': []}
+
+def scan_cache_key():
+    """Cheap freshness key for the untracked-file scan: two stats, no directory listing."""
+    try:
+        media_mtime = os.stat(MEDIA_DIR).st_mtime_ns
+    except FileNotFoundError:
+        media_mtime = None
+    return (media_mtime, data_file_stamp())
 
 def get_untracked_files():
     """Scan folder and exclude files already in JSON."""
-    if not os.path.exists(MEDIA_DIR):
-        os.makedirs(MEDIA_DIR)
-
-    all_files = os.listdir(MEDIA_DIR)
-
-    current_data = load_data()
-    tracked_files = set()
-    
-    # Check for duplicates in media.json
-    seen_src = {}
-    duplicates = []
-    
-    for item in current_data:
-        if 'src' in item:
-            src = item['src']
-            # Robust filename extraction: take last part of URL/path and unquote
-            # unquote handles %20 -> space, %28 -> (, etc.
-            filename_raw = src.split('/')[-1]
-            filename = unquote(filename_raw).strip()
-            tracked_files.add(filename)
-            
-            # Duplicate detection (check strictly by src string first)
-            if src in seen_src:
-                duplicates.append(src)
-            else:
-                seen_src[src] = True
+    key = scan_cache_key()
+    if key != _SCAN_CACHE['key']:
+        _SCAN_CACHE.update(key=key, files=sorted(iter_untracked_files(), key=lambda item: item['name']))
+    return _SCAN_CACHE['files']
+
+# A UTF-8 sequence misread as cp1252: a lead byte (0xC2-0xF4) followed by the right
+# number of continuation bytes (0x80-0xBF), each shown as its cp1252 character.
+# cp1252 leaves 0x81/0x8D/0x8F/0x90/0x9D undefined; browsers show those as U+0081 etc.
+_CP1252_UNDEFINED = '\x81\x8d\x8f\x90\x9d'
+_CP1252_CONT = re.escape(bytes(range(0x80, 0xC0)).decode('cp1252', errors='ignore') + _CP1252_UNDEFINED)
+MOJIBAKE_RUN = re.compile(
+    f'[\xc2-\xdf][{_CP1252_CONT}]|[\xe0-\xef][{_CP1252_CONT}]{{2}}|[\xf0-\xf4][{_CP1252_CONT}]{{3}}'
+)
+# Every character a cp1252 high byte (0x80-0xFF) can show up as
+_CP1252_HIGH = frozenset(bytes(range(0x80, 0x100)).decode('cp1252', errors='ignore') + _CP1252_UNDEFINED)
+
+def repair_mojibake(match):
+    """Decode one misread sequence back to its character, e.g. "ðŸ™‚" -> "🙂"."""
+    return b''.join(c.encode('latin-1') if c in _CP1252_UNDEFINED else c.encode('cp1252')
+                    for c in match.group()).decode('utf-8')
+
+def fix_text(text):
+    """Helper to fix potential encoding issues (Mojibake).
+
+    >>> fix_text('cafÃ© ðŸ™‚ à¤¨à¤®à¤¸à¥\x8dà¤¤à¥‡')
+    'café 🙂 नमस्ते'
+    >>> fix_text('The “CAFÉ” night')
+    'The “CAFÉ” night'
+    >>> fix_text('Anniversary – “GROß” event')
+    'Anniversary – “GROß” event'
+    >>> fix_text('ÉCOLE™ day „Ü“')
+    'ÉCOLE™ day „Ü“'
+    """
+    if not text or text.isascii(): return text
+    # As with a whole-string cp1252 -> utf-8 round-trip, only repair when every cp1252-range
+    # character is part of a misread run: a stray “ or – means this is real typed text
+    if not _CP1252_HIGH.isdisjoint(MOJIBAKE_RUN.sub('', text)): return text
+    try:
+        return MOJIBAKE_RUN.sub(repair_mojibake, text)
+    except UnicodeDecodeError:
+        # A run looked like UTF-8 but isn't (e.g. overlong): not mojibake after all
+        return text
 
-    if duplicates:
-        print(f"⚠️  WARNING: Found {len(duplicates)} duplicate entries in {DATA_FILE}!")
-        for d in duplicates[:3]:
-            print(f"   - {d}")
-        if len(duplicates) > 3: print(f"   ...and {len(duplicates)-3} more")
+def parse_tags(tags_input):
+    """Split a comma separated tag string."""
+    return [t.strip() for t in tags_input.split(',') if t.strip()]
 
-    untracked = []
-    for f in sorted(all_files):
-        if f.startswith('.'): continue
-        if f in tracked_files: continue
+def build_entry(filename, file_type, title, date, desc, tags):
+    """Construct a media.json entry with GitHub LFS URIs."""
+    lfs_uri = make_lfs_uri(filename)
+    entry = {
+        "id": 0,  # Placeholder, set in save_entries
+        "type": file_type,
+        "src": lfs_uri,
+        "title": fix_text(title),
+        "description": fix_text(desc),
+        "date": fix_text(date),
+        "tags": [fix_text(t) for t in tags]
+    }
+    if file_type == 'video':
+        entry["thumbnail"] = lfs_uri
+    return entry
 
-        _, ext = os.path.splitext(f)
-        if ext.lower() in IMAGE_EXTS:
-            untracked.append({'name': f, 'type': 'image'})
-        elif ext.lower() in VIDEO_EXTS:
-            untracked.append({'name': f, 'type': 'video'})
+def prepare_storage():
+    """Create the media folder and an empty JSON database once, instead of checking per request."""
+    os.makedirs(MEDIA_DIR, exist_ok=True)
+    if not os.path.exists(DATA_FILE) or os.path.getsize(DATA_FILE) == 0:
+        with open(DATA_FILE, 'w', encoding='utf-8') as f:
+            f.write('[]\n')
 
-    return untracked
+prepare_storage()
 
 # --- FLASK ROUTES ---
 
 @app.route('/')
 def index():
-    files = get_untracked_files()
-    try:
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            current_json = f.read()
-    except:
-        current_json = "[]"
-
-    return render_template_string(HTML_TEMPLATE,
-                                mode='list',
-                                files=files,
-                                current_json=current_json,
+    # The grid itself streams in from /api/untracked, so the shell renders without scanning
+    # and holds nothing that changes between saves: let the browser reuse it for an hour
+    return render_template(LIST_PAGE,
+                                default_date=DEFAULT_DATE,
                                 media_dir=MEDIA_DIR,
                                 json_file=DATA_FILE,
-                                github_base=GITHUB_LFS_BASE)
+                                github_base=GITHUB_LFS_BASE), {'Cache-Control': 'public, max-age=3600'}
+
+@app.route('/api/untracked')
+def api_untracked():
+    """Stream untracked files as NDJSON, one object per line, while the folder is scanned."""
+    def generate():
+        # Replay the cached scan when nothing changed; otherwise stream a fresh one
+        key = scan_cache_key()
+        if key == _SCAN_CACHE['key']:
+            for item in _SCAN_CACHE['files']:
+                yield json.dumps(item) + '\n'
+            return
+        # Key taken before the scan: a change during it leaves the stored key stale, not the list
+        files = []
+        for item in iter_untracked_files():
+            files.append(item)
+            yield json.dumps(item) + '\n'
+        _SCAN_CACHE.update(key=key, files=sorted(files, key=lambda item: item['name']))
+    # The list itself must never come from the browser cache
+    return Response(generate(), mimetype='application/x-ndjson', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/raw.json')
+def raw_json():
+    """Serve the JSON database as-is for the list view's Raw JSON panel."""
+    data_dir, data_name = os.path.split(os.path.abspath(DATA_FILE))
+    return send_from_directory(data_dir, data_name, mimetype='application/json',
+                               conditional=True, max_age=0)
 
 @app.route('/media/<path:filename>')
 def serve_media(filename):
     """Serve the actual image/video file so the browser can see it."""
-    return send_from_directory(MEDIA_DIR, filename)
+    # conditional=True answers revalidations with 304s and supports Range for scrubbing;
+    # media files are never edited in place, so browsers may keep them for a year
+    response = send_from_directory(MEDIA_DIR, filename, conditional=True, max_age=31536000)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@app.route('/thumb/<path:filename>')
+def serve_thumb(filename):
+    """Serve a small JPEG preview of a video, generating it with ffmpeg on first request."""
+    source = safe_join(MEDIA_DIR, filename)
+    thumb_name = filename + '.jpg'
+    thumb_path = safe_join(THUMB_DIR, thumb_name)
+    if source is None or thumb_path is None or not os.path.isfile(source):
+        return "Not found", 404
+
+    if not os.path.exists(thumb_path) or os.path.getmtime(thumb_path) < os.path.getmtime(source):
+        os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+        # ffmpeg writes a per-request temp file that is swapped in with os.replace, so a
+        # concurrent request never serves (and caches) a half-written JPEG
+        fd, tmp_path = tempfile.mkstemp(suffix='.jpg', prefix='.tmp-', dir=os.path.dirname(thumb_path))
+        os.close(fd)
+        try:
+            # Grab a frame 1s in; very short clips have none there, so retry at the start
+            for seek in ('1', '0'):
+                cmd = ['ffmpeg', '-y', '-v', 'error', '-ss', seek, '-i', source,
+                       '-frames:v', '1', '-vf', 'scale=320:-2', tmp_path]
+                try:
+                    subprocess.run(cmd, capture_output=True, stdin=subprocess.DEVNULL, timeout=30)
+                except (FileNotFoundError, subprocess.TimeoutExpired):
+                    return "Thumbnail unavailable", 404
+                if os.path.getsize(tmp_path) > 0:
+                    break
+            else:
+                return "Thumbnail unavailable", 404
+            try:
+                os.replace(tmp_path, thumb_path)
+            except PermissionError:
+                # Windows: another request is already serving the thumb it just swapped in
+                pass
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    return send_from_directory(THUMB_DIR, thumb_name, conditional=True, max_age=3600)
 
 @app.route('/add/<filename>')
 def edit_media(filename):
     """Show the form to edit details with student tag selector."""
     _, ext = os.path.splitext(filename)
-    file_type = 'image' if ext.lower() in IMAGE_EXTS else 'video'
+    file_type = EXT_TO_TYPE.get(ext.lower(), 'video')
     lfs_uri = make_lfs_uri(filename)
 
     # Get defaults from query params (for persistence) or config
     current_date = request.args.get('date', DEFAULT_DATE)
     current_tags = request.args.get('extra_tags', '')
 
-    return render_template_string(HTML_TEMPLATE,
-                                mode='edit',
+    return render_template(EDIT_PAGE,
                                 filename=filename,
                                 file_type=file_type,
                                 default_title=DEFAULT_TITLE,
@@ -326,47 +778,9 @@ def save_media():
 
     # Process extra tags (comma separated)
     extra_tags_input = request.form.get('extra_tags', '')
-    extra_tags = [t.strip() for t in extra_tags_input.split(',') if t.strip()]
-
-
-    # Combine all tags
-    all_tags = extra_tags
-
-    # Build GitHub LFS URI
-    lfs_uri = make_lfs_uri(filename)
-
-    # Helper to fix potential encoding issues (Mojibake)
-    def fix_text(text):
-        if not text: return text
-        try:
-            # excessive defensive decoding:
-            # If the text was received as windows-1252 bytes misinterpreted as UTF-8,
-            # we try to reverse it.
-            # E.g. "ðŸ™‚" (4 chars) -> bytes -> "🙂"
-            return text.encode('cp1252').decode('utf-8')
-        except UnicodeEncodeError:
-            # If it contains characters not in cp1252 (like real emojis), 
-            # then it's likely already correct (or a different issue).
-            return text
-        except UnicodeDecodeError:
-            # If the bytes aren't valid utf-8, give up
-            return text
-
-    # Construct the entry with LFS URIs
-    entry = {
-        "id": 0,  # Placeholder, set in save_entry
-        "type": file_type,
-        "src": lfs_uri,
-        "title": fix_text(title),
-        "description": fix_text(desc),
-        "date": fix_text(date),
-        "tags": [fix_text(t) for t in all_tags]
-    }
+    extra_tags = parse_tags(extra_tags_input)
 
-    if file_type == 'video':
-        entry["thumbnail"] = lfs_uri
-
-    save_entry(entry)
+    save_entry(build_entry(filename, file_type, title, date, desc, extra_tags))
 
     # Auto-advance to next untracked file
     remaining = get_untracked_files()
@@ -375,9 +789,42 @@ def save_media():
 
     return redirect(url_for('index'))
 
+@app.route('/save_bulk', methods=['POST'])
+def save_media_bulk():
+    """Add many untracked files with shared details in one write."""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'expected a JSON object'}), 400
+    selected = payload.get('files') or []
+    if not isinstance(selected, list) or not all(isinstance(name, str) for name in selected):
+        return jsonify({'error': 'files must be a list of filenames'}), 400
+    title = payload.get('title', '')
+    date = payload.get('date', DEFAULT_DATE)
+    desc = payload.get('description', '')
+    extra_tags = payload.get('extra_tags', '')
+    if not all(isinstance(field, str) for field in (title, date, desc, extra_tags)):
+        return jsonify({'error': 'title, date, description and extra_tags must be strings'}), 400
+    extra_tags = parse_tags(extra_tags)
+
+    # Only accept files that are really in the media folder and not tracked yet
+    untracked = {f['name']: f['type'] for f in get_untracked_files()}
+    entries = [build_entry(name, untracked[name], title, date, desc, extra_tags)
+               for name in dict.fromkeys(selected) if name in untracked]
+    if entries:
+        save_entries(entries)
+
+    return jsonify({'saved': len(entries), 'redirect': url_for('index')})
+
 if __name__ == '__main__':
     print(f"🚀 Gallery Admin running on http://127.0.0.1:5000")
     print(f"📂 Scanning folder: {MEDIA_DIR}")
     print(f"💾 Saving to: {DATA_FILE}")
     print(f"🔗 GitHub LFS base: {GITHUB_LFS_BASE}")
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # FLASK_DEBUG=1 turns on the reloader for development (without the interactive debugger).
+    # Otherwise prefer waitress when installed; on Linux, gunicorn -w 1 -k gthread --threads 8 scan:app
+    # also works (one worker: saves are serialized by an in-process lock)
+    debug = os.environ.get('FLASK_DEBUG') == '1'
+    if serve and not debug:
+        serve(app, host='127.0.0.1', port=5000, threads=8)
+    else:
+        app.run(debug=debug, use_debugger=False, port=5000, threaded=True)
\ No newline at end of file